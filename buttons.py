@@ -2,22 +2,38 @@
     Модуль для создания различных кнопок для Telegram-бота.
     Содержит функции для генерации кнопок с помощью классов клавиатур.
 """
+import functools
 import random
+from itertools import chain
 
 from keyboard import ReplyKeyboard
-from telebot import types
+from telebot.types import KeyboardButton
 from btn_text import BTN_STAR_GEME, BTN_VIEW_RATING, BTN_ADD_WORD, BTN_DEL_WORD
 
+# Кнопки с постоянным текстом создаются один раз при импорте модуля
+_START_BTN = KeyboardButton(BTN_STAR_GEME)
+_ADD_BTN = KeyboardButton(BTN_ADD_WORD)
+_DEL_BTN = KeyboardButton(BTN_DEL_WORD)
+_RATING_BTN = KeyboardButton(BTN_VIEW_RATING)
+_TAIL_BUTTONS = (_ADD_BTN, _DEL_BTN, _RATING_BTN)
 
+# Отдельный генератор для перемешивания кнопок, не зависящий от общего состояния модуля random
+_RNG = random.Random()
+
+
+@functools.lru_cache(maxsize=1)
 def start_button() -> object:
     """
         Функция для создания стартовой клавиатуры с кнопками.
 
+        Клавиатура не зависит от аргументов, поэтому создается один раз,
+        а последующие вызовы возвращают тот же объект.
+
         :return:
             ReplyKeyboard: Объект клавиатуры .
     """
     reply_keyboard = ReplyKeyboard()
-    reply_keyboard.add_button(types.KeyboardButton(BTN_STAR_GEME))
+    reply_keyboard.add_button(_START_BTN)
 
     return reply_keyboard.get_markup()
 
@@ -27,7 +43,7 @@ def translation_buttons(text_buttons: list) -> object:
         Создает клавиатуру для выбора перевода слова.
 
         Функция генерирует клавиатуру с вариантами перевода, случайно перемешивая
-        предоставленные слова. В конце списка кнопок добавляется кнопка для
+        предоставленные слова (переданный список при этом не изменяется). В конце списка кнопок добавляется кнопка для
         просмотра статистики.
 
         :param text_buttons: list Список слов для отображения на кнопках.
@@ -35,12 +51,8 @@ def translation_buttons(text_buttons: list) -> object:
         :return: Клавиатура с кнопками для выбора перевода слова и просмотра статистики.
     """
     reply_keyboard = ReplyKeyboard(row_width=2)
-    random.shuffle(text_buttons)
-    buttons = [types.KeyboardButton(word) for word in text_buttons]
-    buttons.append(types.KeyboardButton(BTN_ADD_WORD))
-    buttons.append(types.KeyboardButton(BTN_DEL_WORD))
-    buttons.append(types.KeyboardButton(BTN_VIEW_RATING))
-    reply_keyboard.add_button(*buttons)
+    buttons = _buttons_for(tuple(sorted(text_buttons)))
+    reply_keyboard.add_buttons(chain(_RNG.sample(buttons, len(buttons)), _TAIL_BUTTONS))
     return reply_keyboard.get_markup()
 
 
@@ -49,13 +61,26 @@ def universal_buttons(text_buttons: list) -> object:
     Создает клавиатуру с кнопками на основе переданного списка слов.
 
     Функция генерирует клавиатуру с кнопками, используя слова, переданные в качестве аргумента.
-    Кнопки отображаются в случайном порядке.
+    Кнопки отображаются в случайном порядке, переданный список при этом не изменяется.
 
     :param text_buttons: list Список слов для отображения на кнопках.
     :return: Клавиатура с кнопками для выбора.
     """
-    reply_keyboard = types.ReplyKeyboardMarkup(row_width=2, resize_keyboard=True)
-    random.shuffle(text_buttons)
-    buttons = [types.KeyboardButton(word) for word in text_buttons]
-    reply_keyboard.add(*buttons)
-    return reply_keyboard
+    reply_keyboard = ReplyKeyboard(row_width=2)
+    buttons = _buttons_for(tuple(sorted(text_buttons)))
+    reply_keyboard.add_buttons(_RNG.sample(buttons, len(buttons)))
+    return reply_keyboard.get_markup()
+
+
+@functools.lru_cache(maxsize=512)
+def _buttons_for(words: tuple) -> tuple:
+    """
+    Создает кнопки для набора слов и кэширует их.
+
+    Ключом кэша служит отсортированный кортеж слов, поэтому порядок слов
+    не влияет на попадание в кэш. Перемешивание выполняется вызывающей функцией.
+
+    :param words: tuple Отсортированный кортеж слов для кнопок.
+    :return: Кортеж кнопок в том же порядке, что и слова.
+    """
+    return tuple(KeyboardButton(word) for word in words)
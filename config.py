@@ -16,6 +16,11 @@ DB_PATH = {'dbname': dbname,
            'user': dbuser,
            'password': password
            }
+DB_POOL = {'minconn': int(os.getenv('db_pool_min', 2)),
+           'maxconn': int(os.getenv('db_pool_max', 10))
+           }
+BOT_THREADS = int(os.getenv('bot_threads', 4))
+BACKGROUND_THREADS = int(os.getenv('background_threads', 4))
 
 
 def config_logging(level=logging.INFO):
@@ -2,47 +2,162 @@
 Модуль для подключения к бд
 """
 
+import atexit
+import hashlib
 import logging
+import re
+import threading
+from contextlib import contextmanager
+
 import psycopg2
-from psycopg2 import sql
-from config import DB_PATH, config_logging
+from psycopg2 import extensions, pool, sql
+from psycopg2.extras import execute_values
+from config import DB_PATH, DB_POOL, config_logging
 
 config_logging()
 logger = logging.getLogger('database')
 
 
+class PreparedConnection(extensions.connection):
+    """
+    Соединение psycopg2, которое помнит подготовленные на нем запросы.
+
+    Подготовленные запросы (PREPARE) существуют только в рамках сессии,
+    поэтому набор их имен хранится отдельно для каждого соединения.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared = set()
+
+
+def _to_positional(query: str) -> str:
+    """
+    Заменяет заполнители %s на позиционные параметры $1, $2, ... для PREPARE.
+
+    :param query: Текст запроса с заполнителями psycopg2.
+    :return: Текст запроса с позиционными параметрами.
+    """
+    parts = query.split('%s')
+    result = parts[0]
+    for idx, part in enumerate(parts[1:], start=1):
+        result += f'${idx}{part}'
+    return result.replace('%%', '%')
+
+
+_ORDER_BY_ITEM = re.compile(r'([a-z_][a-z0-9_]*(?:\.[a-z_][a-z0-9_]*)?)(?:\s+(asc|desc))?')
+
+
+def _normalize_order_by(order_by: str) -> str:
+    """
+    Проверяет выражение ORDER BY и приводит его к каноническому виду.
+
+    Допускаются только имена столбцов с необязательным направлением ASC/DESC,
+    поэтому в запрос не попадет произвольный SQL, а одинаковая сортировка,
+    записанная по-разному, дает один и тот же текст подготовленного запроса.
+
+    :param order_by: Выражение сортировки, например 'points desc, name'.
+    :return: Каноническое выражение, например 'points DESC, name ASC'.
+    :raises ValueError: Если выражение содержит что-то кроме столбцов и направлений.
+    """
+    items = []
+    for item in order_by.split(','):
+        match = _ORDER_BY_ITEM.fullmatch(item.strip().lower())
+        if match is None:
+            raise ValueError(f"Недопустимое выражение ORDER BY: {order_by!r}")
+        column, direction = match.groups()
+        items.append(f"{column} {(direction or 'asc').upper()}")
+    return ', '.join(items)
+
+
 class Database:
     """
     Класс для управления подключением и операциями с базой данных.
+
+    Соединения берутся из общего для всех экземпляров пула, поэтому
+    каждый запрос не открывает новое подключение к серверу.
+    Запросы select_data, insert_data, update_data и delete_data подготавливаются
+    на сервере один раз для каждого соединения и дальше только выполняются.
     """
 
+    _pool = None
+    _pool_slots = None
+    _stmt_cache: dict[str, str] = {}
+
     def __init__(self, dbname=DB_PATH['dbname'], user=DB_PATH['user'], password=DB_PATH['password'],
-                 host='localhost', port=5432):
+                 host='localhost', port=5432,
+                 minconn=DB_POOL['minconn'], maxconn=DB_POOL['maxconn']):
         """
-            Инициализация соединения с базой данных.
+            Инициализация пула соединений с базой данных.
+
+            Пул создается при первом создании экземпляра и переиспользуется остальными.
 
             :param dbname: Имя базы данных.
             :param user: Имя пользователя базы данных.
             :param password: Пароль пользователя базы данных.
             :param host: Хост базы данных (по умолчанию 'localhost').
             :param port: Порт базы данных (по умолчанию 5432).
+            :param minconn: Количество соединений, открываемых сразу (по умолчанию из `db_pool_min`).
+            :param maxconn: Максимальное количество соединений в пуле (по умолчанию из `db_pool_max`).
         """
-        self.conn = None
-        self.cur = None
-        try:
-            self.conn = psycopg2.connect(dbname=dbname, user=user,
-                                         password=password, host=host, port=port)
-            self.cur = self.conn.cursor()
-            logger.info(f"Соединение с {dbname} успешно")
-        except psycopg2.OperationalError:
-            logger.error(f"Ошибка подключения к {dbname}")
-
-    def __del__(self):
-        """Закрытие соединения и курсора при уничтожении объекта."""
-        if self.cur:
-            self.cur.close()
-        if self.conn:
-            self.conn.close()
+        if Database._pool is None:
+            try:
+                Database._pool = pool.ThreadedConnectionPool(
+                    minconn=minconn, maxconn=maxconn, dbname=dbname, user=user,
+                    password=password, host=host, port=port,
+                    connection_factory=PreparedConnection
+                )
+                # ThreadedConnectionPool не ждет свободного соединения, а выбрасывает PoolError,
+                # поэтому число одновременно выданных соединений ограничивается семафором
+                Database._pool_slots = threading.BoundedSemaphore(maxconn)
+                atexit.register(Database._pool.closeall)
+                logger.info(f"Соединение с {dbname} успешно")
+            except psycopg2.OperationalError:
+                logger.error(f"Ошибка подключения к {dbname}")
+
+    @contextmanager
+    def get_conn(self):
+        """
+        Выдает соединение из пула и возвращает его обратно после использования.
+
+        Если все соединения пула заняты, ожидает, пока одно из них не освободится.
+        Незавершенная транзакция откатывается пулом при возврате соединения.
+
+        :return: Соединение psycopg2.
+        """
+        with self._pool_slots:
+            conn = self._pool.getconn()
+            try:
+                yield conn
+            finally:
+                self._pool.putconn(conn)
+
+    def _execute_prepared(self, cur, query: str, values=None):
+        """
+        Выполняет запрос через подготовленный на сервере оператор.
+
+        При первом выполнении запроса на соединении он подготавливается командой PREPARE,
+        при последующих — только выполняется командой EXECUTE, без повторного
+        разбора и планирования на сервере.
+
+        :param cur: Курсор соединения из пула.
+        :param query: Текст запроса с заполнителями %s.
+        :param values: Значения для подстановки в запрос.
+        """
+        name = self._stmt_cache.get(query)
+        if name is None:
+            name = f"stmt_{hashlib.md5(query.encode('utf-8')).hexdigest()}"
+            self._stmt_cache[query] = name
+
+        conn = cur.connection
+        if name not in conn.prepared:
+            cur.execute(f'PREPARE {name} AS {_to_positional(query)}')
+            conn.prepared.add(name)
+
+        if values:
+            cur.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(values))})", values)
+        else:
+            cur.execute(f'EXECUTE {name}')
 
     def create_table(self, table_name: str, columns: list | tuple):
         """
@@ -55,12 +170,39 @@ class Database:
         try:
             columns_str = ', '.join(f'{col[0]} {col[1]}' for col in columns)
             query = sql.SQL(f"CREATE TABLE IF NOT EXISTS {table_name} ({columns_str})")
-            self.cur.execute(query)
-            self.conn.commit()
+            with self.get_conn() as conn, conn.cursor() as cur:
+                cur.execute(query)
+                conn.commit()
             logger.info(f"Таблица {table_name} успешно создана")
         except psycopg2.DatabaseError as e:
             logger.error(f"Ошибка при создании таблицы {table_name}: {e}")
 
+    def create_index(self, index_name: str, table_name: str, columns: str,
+                     unique: bool = False, include: str = None, condition: str = None):
+        """
+        Создание индекса, если он еще не существует.
+
+        :param index_name: Имя индекса.
+        :param table_name: Имя таблицы.
+        :param columns: Столбцы индекса, строка SQL (например, 'user_id, word_id').
+        :param unique: Создать уникальный индекс.
+        :param include: Необязательные неключевые столбцы для покрывающего индекса, строка SQL.
+        :param condition: Необязательное условие WHERE для частичного индекса, строка SQL.
+        """
+        try:
+            unique_str = 'UNIQUE ' if unique else ''
+            query = f"CREATE {unique_str}INDEX IF NOT EXISTS {index_name} ON {table_name} ({columns})"
+            if include:
+                query += f" INCLUDE ({include})"
+            if condition:
+                query += f" WHERE {condition}"
+            with self.get_conn() as conn, conn.cursor() as cur:
+                cur.execute(query)
+                conn.commit()
+            logger.info(f"Индекс {index_name} успешно создан")
+        except psycopg2.DatabaseError as e:
+            logger.error(f"Ошибка при создании индекса {index_name}: {e}")
+
     def drop_table(self, table_name: str):
         """
         Удаление таблицы из базы данных.
@@ -69,8 +211,9 @@ class Database:
         """
         try:
             query = sql.SQL(f"DROP TABLE IF EXISTS {table_name}")
-            self.cur.execute(query)
-            self.conn.commit()
+            with self.get_conn() as conn, conn.cursor() as cur:
+                cur.execute(query)
+                conn.commit()
             logger.info(f'Таблица успешно удалена {table_name}')
         except psycopg2.DatabaseError as e:
             logger.error(f"Ошибка при удалении таблицы {table_name}: {e}")
@@ -87,21 +230,51 @@ class Database:
         try:
             columns = data.keys()
             values = data.values()
-            query = sql.SQL(
+            query = (
                 f"INSERT INTO {table_name} ({', '.join(columns)})"
                 f" VALUES ({', '.join(['%s'] * len(values))}) RETURNING id"
             )
-            self.cur.execute(query, list(values))
-            inserted_id = self.cur.fetchone()[0]
-            self.conn.commit()
+            with self.get_conn() as conn, conn.cursor() as cur:
+                self._execute_prepared(cur, query, list(values))
+                inserted_id = cur.fetchone()[0]
+                conn.commit()
             logger.info(f'Данные {data} в таблицу {table_name} успешно добавлены')
             return inserted_id
         except psycopg2.DatabaseError as e:
             logger.error(f"Ошибка при вставке данных в таблицу {table_name}: {e}")
             return None
 
+    def insert_many(self, table_name: str, columns: list, rows: list,
+                    on_conflict: str = None, returning: str = None) -> list:
+        """
+        Вставка нескольких строк в таблицу одним запросом.
+
+        :param table_name: Имя таблицы.
+        :param columns: Список столбцов, в которые выполняется вставка.
+        :param rows: Список кортежей со значениями в порядке `columns`.
+        :param on_conflict: Необязательное продолжение ON CONFLICT, строка SQL
+        (например, '(column) DO NOTHING').
+        :param returning: Необязательный список столбцов для RETURNING, строка SQL.
+        :return: Список кортежей из RETURNING или пустой список.
+        """
+        try:
+            query = f"INSERT INTO {table_name} ({', '.join(columns)}) VALUES %s"
+            if on_conflict:
+                query += f" ON CONFLICT {on_conflict}"
+            if returning:
+                query += f" RETURNING {returning}"
+            with self.get_conn() as conn, conn.cursor() as cur:
+                result = execute_values(cur, query, rows, fetch=returning is not None)
+                conn.commit()
+            logger.info(f'Данные ({len(rows)} строк) в таблицу {table_name} успешно добавлены')
+            return result or []
+        except psycopg2.DatabaseError as e:
+            logger.error(f"Ошибка при вставке данных в таблицу {table_name}: {e}")
+            return []
+
     def select_data(self, table_name, columns: str = '*',
-                    condition: str = None, values: tuple = None):
+                    condition: str = None, values: tuple = None,
+                    order_by: str = None, limit: int = None, stream: bool = False):
         """
         Выполнение SELECT-запроса.
 
@@ -109,15 +282,30 @@ class Database:
         :param columns: Список столбцов для выборки, по умолчанию '*' - все столбцы.
         :param condition: Условие WHERE для фильтрации данных, строка SQL.
         :param values: Значения для подстановки в условие WHERE, кортеж.
-        :return: Список кортежей с данными.
+        :param order_by: Столбцы сортировки с необязательным направлением ASC/DESC,
+        например 'points DESC'. Другие выражения не допускаются.
+        :param limit: Максимальное количество строк, передается параметром запроса.
+        :param stream: Читать строки серверным курсором порциями, не загружая весь результат.
+        Ошибки при этом возникают во время итерации (см. `stream_query`).
+        :return: Список кортежей с данными или итератор по ним, если `stream` установлен.
         """
+        if order_by:
+            order_by = _normalize_order_by(order_by)
         try:
             columns_str = ', '.join(columns) if isinstance(columns, list) else columns
-            query = sql.SQL(f"SELECT {columns_str} FROM {table_name}")
+            query = f"SELECT {columns_str} FROM {table_name}"
             if condition:
-                query += sql.SQL(f" WHERE {condition}")
-            self.cur.execute(query, values)
-            rows = self.cur.fetchall()
+                query += f" WHERE {condition}"
+            if order_by:
+                query += f" ORDER BY {order_by}"
+            if limit is not None:
+                query += " LIMIT %s"
+                values = (*(values or ()), limit)
+            if stream:
+                return self.stream_query(query, values)
+            with self.get_conn() as conn, conn.cursor() as cur:
+                self._execute_prepared(cur, query, values)
+                rows = cur.fetchall()
             return rows
         except psycopg2.DatabaseError as e:
             logger.error(f"Ошибка при выполнении SELECT из таблицы {table_name}: {e}")
@@ -129,39 +317,111 @@ class Database:
 
         :param table_name: Имя таблицы.
         :param data: Словарь с данными для обновления
-        в формате {'column1': value1, 'column2': value2, ...}. Если value1 это строка,
-        которая содержит арифметическое выражение (например, "column + 1"),
-        то она будет использована напрямую в SQL-запросе.
+        в формате {'column1': value1, 'column2': value2, ...}. Все значения передаются
+        параметрами запроса; для увеличения значения столбца используйте `increment_column`.
         :param condition: Условие WHERE для фильтрации записей, строка SQL.
         :param values: Необязательный параметр. Значения для подстановки в условие WHERE, кортеж.
 
         :return: True, если обновление прошло успешно, иначе False.
         """
         try:
-            set_clause = []
-            query_values = []
+            set_clause = [f"{column} = %s" for column in data]
+            query_values = list(data.values())
 
-            for column, value in data.items():
-                # Проверка на арифметическое выражение
-                if isinstance(value, str) and any(op in value for op in ['+', '-', '*', '/']):
-                    set_clause.append(f"{column} = {value}")
-                else:
-                    set_clause.append(f"{column} = %s")
-                    query_values.append(value)
-
-            query = sql.SQL(f"UPDATE {table_name} SET {', '.join(set_clause)} WHERE {condition}")
+            query = f"UPDATE {table_name} SET {', '.join(set_clause)} WHERE {condition}"
 
             if values:
                 query_values.extend(values)
 
-            self.cur.execute(query, query_values)
-            self.conn.commit()
+            with self.get_conn() as conn, conn.cursor() as cur:
+                self._execute_prepared(cur, query, query_values)
+                conn.commit()
             logger.info(f'Обновление в таблице {table_name} прошло успешно')
             return True
         except psycopg2.DatabaseError as e:
             logger.error(f"Ошибка при обновлении данных в таблице {table_name}: {e}")
             return False
 
+    def increment_column(self, table_name: str, column: str, delta: int,
+                         condition: str, values: tuple = None) -> bool:
+        """
+        Увеличивает значение числового столбца на `delta` (или уменьшает при отрицательном).
+
+        Текст запроса зависит только от таблицы, столбца и условия, а величина изменения
+        передается параметром, поэтому подготовленный запрос переиспользуется.
+
+        :param table_name: Имя таблицы.
+        :param column: Имя изменяемого столбца.
+        :param delta: Величина изменения.
+        :param condition: Условие WHERE для фильтрации записей, строка SQL.
+        :param values: Значения для подстановки в условие WHERE, кортеж.
+
+        :return: True, если была изменена хотя бы одна строка, иначе False.
+        """
+        try:
+            query = f"UPDATE {table_name} SET {column} = {column} + %s WHERE {condition}"
+            with self.get_conn() as conn, conn.cursor() as cur:
+                self._execute_prepared(cur, query, (delta, *(values or ())))
+                updated = cur.rowcount
+                conn.commit()
+            return updated > 0
+        except psycopg2.DatabaseError as e:
+            logger.error(f"Ошибка при изменении столбца {column} в таблице {table_name}: {e}")
+            return False
+
+    def execute_query(self, query: str, values: tuple = None, fetch: bool = False,
+                      prepare: bool = False):
+        """
+        Выполнение произвольного запроса в одной транзакции.
+
+        :param query: Текст запроса, строка SQL.
+        :param values: Значения для подстановки в запрос, кортеж.
+        :param fetch: Вернуть строки результата запроса.
+        :param prepare: Выполнить запрос через подготовленный на сервере оператор.
+        Подходит для часто выполняемых запросов с неизменным текстом.
+        :return: Список кортежей с данными, если `fetch` установлен,
+        иначе True, если запрос выполнен успешно. При ошибке — пустой список или False.
+        """
+        try:
+            with self.get_conn() as conn, conn.cursor() as cur:
+                if prepare:
+                    self._execute_prepared(cur, query, values)
+                else:
+                    cur.execute(query, values)
+                rows = cur.fetchall() if fetch else True
+                conn.commit()
+            return rows
+        except psycopg2.DatabaseError as e:
+            logger.error(f"Ошибка при выполнении запроса: {e}")
+            return [] if fetch else False
+
+    def stream_query(self, query: str, values: tuple = None, itersize: int = 500):
+        """
+        Выполнение SELECT-запроса через именованный (серверный) курсор.
+
+        Строки передаются с сервера порциями по `itersize` и сразу отдаются вызывающему,
+        поэтому полный список результата в памяти не создается. Соединение занято,
+        пока итератор не будет исчерпан.
+
+        :param query: Текст запроса, строка SQL.
+        :param values: Значения для подстановки в запрос, кортеж.
+        :param itersize: Количество строк, получаемых с сервера за один раз.
+        :return: Итератор по кортежам с данными.
+        :raises psycopg2.DatabaseError: Если запрос или чтение результата завершились ошибкой.
+        Часть строк к этому моменту может быть уже получена, поэтому ошибка не скрывается.
+        """
+        try:
+            with self.get_conn() as conn:
+                with conn.cursor(name='stream_cursor') as cur:
+                    cur.itersize = itersize
+                    cur.execute(query, values)
+                    yield from cur
+                # Именованный курсор закрывается до фиксации: COMMIT его уничтожает
+                conn.commit()
+        except psycopg2.DatabaseError as e:
+            logger.error(f"Ошибка при потоковом чтении результата запроса: {e}")
+            raise
+
     def delete_data(self, table_name: str, condition: str = None, values: tuple = None) -> bool:
         """
         Выполнение DELETE-запроса.
@@ -169,18 +429,19 @@ class Database:
         :param table_name: Имя таблицы, из которой нужно удалить данные.
         :param condition: Условие WHERE для фильтрации данных, строка SQL.
         :param values: Значения для подстановки в условие WHERE, кортеж.
-        :return: True, если удаление прошло успешно, иначе False.
+        :return: True, если была удалена хотя бы одна строка, иначе False.
         """
         try:
-            query = sql.SQL(f"DELETE FROM {table_name}")
+            query = f"DELETE FROM {table_name}"
             if condition:
-                query += sql.SQL(f" WHERE {condition}")
-            self.cur.execute(query, values)
-            self.conn.commit()
-            return True
+                query += f" WHERE {condition}"
+            with self.get_conn() as conn, conn.cursor() as cur:
+                self._execute_prepared(cur, query, values)
+                deleted = cur.rowcount
+                conn.commit()
+            return deleted > 0
         except psycopg2.DatabaseError as e:
             logger.error(f"Ошибка при удалении данных из таблицы {table_name}: {e}")
-            self.conn.rollback()
             return False
 
 if __name__ == '__main__':
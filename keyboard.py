@@ -36,6 +36,26 @@ class ReplyKeyboard:
         """
         self.markup.add(*buttons)
 
+    def add_buttons(self, buttons):
+        """
+        Добавление кнопок из итерируемого объекта.
+
+        В отличие от add_button, кнопки не распаковываются в аргументы вызова,
+        а сразу раскладываются по строкам с учетом row_width.
+
+        :param buttons: Итерируемый объект с кнопками для добавления.
+        """
+        row_width = self.markup.row_width
+        keyboard = self.markup.keyboard
+        row = []
+        for button in buttons:
+            row.append(button.to_dict())
+            if len(row) == row_width:
+                keyboard.append(row)
+                row = []
+        if row:
+            keyboard.append(row)
+
     def add_row(self, *buttons):
         """
         Добавление кнопок в одной строке.
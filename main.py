@@ -6,7 +6,7 @@ import logging
 import telebot
 
 from handlers import Handlers
-from config import TELEBOT_TOKEN, config_logging
+from config import TELEBOT_TOKEN, BOT_THREADS, config_logging
 from utils import DatabaseUtils
 from time import sleep
 
@@ -30,7 +30,9 @@ class Bot_star:
             :param api_token (str): Токен API для подключения к Telegram.
         """
 
-        self.bot = telebot.TeleBot(api_token)
+        # Обработчики выполняются параллельно в BOT_THREADS потоках, каждый берет
+        # соединение из общего пула, поэтому ожидание базы данных не блокирует остальных
+        self.bot = telebot.TeleBot(api_token, num_threads=BOT_THREADS)
         self.handlers = Handlers(self.bot)
 
     def run(self):
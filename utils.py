@@ -4,17 +4,98 @@
     для работы с пользователями и словами.
 """
 import csv
+import io
 import logging
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+import math
+import os
 import random
+import tempfile
+import threading
+import time
+from itertools import islice
+
+import psycopg2
 
 from database import Database
-from config import config_logging
+from utils_sql import (SQL_ADD_USER_WORD, SQL_DELETE_USER_WORD, SQL_GET_RATINGS,
+                       SQL_GET_USER_WORDS, SQL_RATING_SNAPSHOT, SQL_RECORD_CORRECT_ANSWER,
+                       SQL_SAMPLE_WORDS, SQL_SEARCH_GLOBAL_WORD, SQL_SEARCH_USER,
+                       SQL_SEARCH_USER_WORD)
+from config import BACKGROUND_THREADS, config_logging
 from buttons import translation_buttons, start_button, universal_buttons
 from btn_text import BTN_VIEW_RATING, BTN_ADD_WORD, BTN_DEL_WORD, BTN_Back
 
 config_logging()
 logger = logging.getLogger('utils')
 
+# Неизменяемые клавиатуры создаются один раз при импорте модуля
+_BACK_MARKUP = universal_buttons([BTN_Back])
+_START_MARKUP = start_button()
+
+CSV_PATH = 'russian_english_words.csv'
+CSV_COMPACT_INTERVAL = 50
+USER_CACHE_TTL = 60
+RATING_CACHE_TTL = 60
+
+# Строка рейтинга игроков
+Rating = namedtuple('Rating', 'telegram_user_id name points position')
+
+# Резервный набор русско-английских пар на случай, если слов в CSV и базе данных не хватает
+_FALLBACK_WORDS = (
+    ('кот', 'cat'),
+    ('собака', 'dog'),
+    ('молоко', 'milk'),
+    ('хлеб', 'bread'),
+    ('яблоко', 'apple'),
+    ('машина', 'car'),
+    ('дом', 'house'),
+    ('окно', 'window'),
+    ('дерево', 'tree'),
+    ('книга', 'book'),
+    ('ручка', 'pen'),
+    ('стол', 'table'),
+    ('стул', 'chair'),
+    ('часы', 'clock'),
+    ('зонт', 'umbrella'),
+    ('солнце', 'sun'),
+    ('луна', 'moon'),
+    ('звезда', 'star'),
+    ('рыба', 'fish'),
+    ('птица', 'bird'),
+)
+
+
+def _reservoir_sample(rows, quantity: int, rng=random) -> list:
+    """
+    Выбирает случайные элементы из итерируемого объекта за один проход.
+
+    Используется алгоритм L резервуарной выборки: в памяти хранится только
+    `quantity` элементов, а промежуточные элементы пропускаются без разбора.
+
+    :param rows: Итерируемый объект с элементами для выборки.
+    :param quantity: Количество элементов, которое нужно выбрать.
+    :param rng: Генератор случайных чисел (по умолчанию модуль random).
+    :return: list Список выбранных элементов в случайном порядке
+             (меньше `quantity`, если элементов не хватило).
+    """
+    rows = iter(rows)
+    reservoir = list(islice(rows, quantity))
+
+    if quantity > 0 and len(reservoir) == quantity:
+        weight = math.exp(math.log(rng.random()) / quantity)
+        while True:
+            skip = math.floor(math.log(rng.random()) / math.log(1 - weight))
+            row = next(islice(rows, skip, None), None)
+            if row is None:
+                break
+            reservoir[rng.randrange(quantity)] = row
+            weight *= math.exp(math.log(rng.random()) / quantity)
+
+    rng.shuffle(reservoir)
+    return reservoir
+
 
 class GameUtils:
     """
@@ -25,9 +106,48 @@ class GameUtils:
             db (DatabaseUtils): Объект для взаимодействия с базой данных.
     """
 
+    _csv_consumed: set | None = None
+    _csv_cache: list | None = None
+    _csv_header: list | None = None
+    _csv_mtime: float = 0.0
+    _csv_lock = threading.Lock()
+    _turn_counter: int = 0
+
     def __init__(self, bot):
         self.bot = bot
         self.db = DatabaseUtils()
+        # Фоновые задачи: запись результатов в БД и подготовка следующего слова
+        self._rng = random.Random()
+        self._executor = ThreadPoolExecutor(max_workers=BACKGROUND_THREADS)
+        self._pending = {}
+        # Обработчики кнопок меню, доступных во время игры
+        self._actions = {
+            BTN_VIEW_RATING: self._handle_rating,
+            BTN_ADD_WORD: self.add_new_word,
+            BTN_DEL_WORD: self.dell_word_user,
+        }
+
+    def _submit(self, func, *args, **kwargs):
+        """
+            Выполняет функцию в фоновом потоке и логирует возникшие в ней ошибки.
+
+            :param func: Функция для выполнения.
+            :return: concurrent.futures.Future с результатом выполнения.
+        """
+        future = self._executor.submit(func, *args, **kwargs)
+        future.add_done_callback(self._log_future_error)
+        return future
+
+    @staticmethod
+    def _log_future_error(future):
+        """
+            Логирует исключение, возникшее в фоновой задаче.
+
+            :param future: Завершенная задача concurrent.futures.Future.
+        """
+        error = future.exception()
+        if error is not None:
+            logger.error(f'Ошибка в фоновой задаче: {error}')
 
     def get_user_name(self, message):
         """
@@ -74,10 +194,23 @@ class GameUtils:
             неправильных вариантов перевода. После этого отправляет пользователю сообщение
             с предложением выбрать правильный перевод.
 
+            Слово для следующего раунда готовится в фоновом потоке заранее, поэтому
+            при ответе пользователя не приходится ждать запросов к базе данных.
+
             :param message: Сообщение от пользователя, содержащее его идентификатор.
         """
         chat_id = message.chat.id
-        word, correct_translation, text_buttons, id_word_db = self.word_generator(message)
+        words = None
+        pending = self._pending.pop(chat_id, None)
+        if pending is not None:
+            try:
+                words = pending.result()
+            except Exception as e:
+                logger.error(f'Ошибка при подготовке слова: {e}')
+
+        if words is None:
+            words = self.word_generator(message)
+        word, correct_translation, text_buttons, id_word_db = words
 
         text_buttons.append(correct_translation)
         markup = translation_buttons(text_buttons)
@@ -87,6 +220,7 @@ class GameUtils:
 
         self.bot.register_next_step_handler_by_chat_id(chat_id, self.check_answer,
                                                        id_word_db, correct_translation)
+        self._pending[chat_id] = self._submit(self.word_generator, message)
 
     def check_answer(self, message, id_word: int, correct_translation: str):
         """
@@ -106,27 +240,60 @@ class GameUtils:
 
         if user_answer == correct_translation:
             self.bot.send_message(chat_id, "Превосходно! Вы справились! 🌟 +1 балл!")
-            self.db.update_points(user_id, 1)
-            self.db.update_times_shown(user_id, id_word)
+            written = self._submit(self.db.record_correct_answer, user_id, id_word)
+            self._drop_stale_round(chat_id, id_word, written)
             self.start_game(message)
+            return
 
-        elif user_answer == BTN_VIEW_RATING:
-            result = self.display_player_rating(user_id)
-            self.bot.send_message(chat_id, result, parse_mode='HTML')
-            self.bot.send_message(chat_id, 'Дя продолжения нажмите кнопку',
-                                  reply_markup=start_button())
-
-        elif user_answer == BTN_ADD_WORD:
-            self.add_new_word(message)
-
-        elif user_answer == BTN_DEL_WORD:
-            self.dell_word_user(message)
-
+        action = self._actions.get(user_answer)
+        if action is not None:
+            action(message)
         else:
             self.bot.send_message(chat_id, "Не совсем так. Но не отчаивайтесь! 💔 -3 балла!")
-            self.db.update_points(user_id, 3, add=False)
+            self._submit(self.db.update_points, user_id, 3, add=False)
             self.start_game(message)
 
+    def _drop_stale_round(self, chat_id: int, id_word: int, written):
+        """
+            Отбрасывает заранее подготовленный раунд с только что отвеченным словом.
+
+            Следующий раунд готовится, пока пользователь думает над ответом, то есть до записи
+            этого ответа в базу данных. Если в него попало то же слово, ответ мог перевести его
+            в изученные, поэтому раунд отбрасывается, а новый выбирается после записи ответа.
+
+            :param chat_id: Идентификатор чата.
+            :param id_word: Идентификатор слова, на которое пользователь ответил.
+            :param written: concurrent.futures.Future записи ответа в базу данных.
+        """
+        pending = self._pending.get(chat_id)
+        if pending is None:
+            return
+        try:
+            stale = pending.result()[3] == id_word
+        except Exception:
+            # Ошибку подготовки обработает start_game
+            return
+
+        if stale:
+            self._pending.pop(chat_id, None)
+            try:
+                written.result()
+            except Exception:
+                # Ошибка записи уже залогирована в _log_future_error
+                pass
+
+    def _handle_rating(self, message):
+        """
+            Отправляет пользователю рейтинг игроков и кнопку для продолжения игры.
+
+            :param message: Сообщение от пользователя.
+        """
+        chat_id = message.chat.id
+        result = self.display_player_rating(message.from_user.id)
+        self.bot.send_message(chat_id, result, parse_mode='HTML')
+        self.bot.send_message(chat_id, 'Дя продолжения нажмите кнопку',
+                              reply_markup=_START_MARKUP)
+
     def add_new_word(self, message):
         """
         Инициирует процесс добавления нового слова для пользователя.
@@ -142,7 +309,7 @@ class GameUtils:
         user_id = message.from_user.id
         self.bot.send_message(chat_id,
                               'Введите слово и его перевод через запятую (например, "кот, cat"):',
-                              reply_markup=universal_buttons([BTN_Back]))
+                              reply_markup=_BACK_MARKUP)
         self.bot.register_next_step_handler(message, self._save_new_word, user_id)
 
     def _save_new_word(self, message, user_id: int):
@@ -168,8 +335,7 @@ class GameUtils:
                 word = text[0].strip()
                 translation = text[1].strip()
 
-                if not self.db.search_word(word, user_id):
-                    self.db.save_word(word, translation, user_id)
+                if self.db.add_user_word(word, translation, user_id):
                     self.bot.send_message(chat_id,
                                           f'Слово "{word}" с переводом "{translation}" '
                                           f'было успешно добавлено.'
@@ -177,7 +343,7 @@ class GameUtils:
 
                     word_message = self._format_user_words(user_id)
                     self.bot.send_message(chat_id, word_message + '\nДя продолжения нажмите кнопку',
-                                          reply_markup=start_button(), parse_mode='HTML')
+                                          reply_markup=_START_MARKUP, parse_mode='HTML')
 
                 else:
                     self.bot.send_message(chat_id,
@@ -201,7 +367,7 @@ class GameUtils:
         word_message = self._format_user_words(user_id)
 
         self.bot.send_message(chat_id, word_message + '\nУкажите слово которое нужно удалить',
-                              reply_markup=universal_buttons([BTN_Back]), parse_mode='HTML')
+                              reply_markup=_BACK_MARKUP, parse_mode='HTML')
         self.bot.register_next_step_handler(message, self._delete_user_word, user_id)
 
     def _delete_user_word(self, message, user_id: int):
@@ -224,18 +390,20 @@ class GameUtils:
             return
 
         result = self.db.delete_word(text, user_id)
+        # Заранее подготовленное слово могло оказаться удаленным
+        self._pending.pop(chat_id, None)
 
         if result:
             self.bot.send_message(chat_id,
                                   f'Слово <b>{text.capitalize()}</b> успешно удалено из базы данных.\n'
                                   'Для продолжения нажмите кнопку.',
-                                  reply_markup=start_button(),
+                                  reply_markup=_START_MARKUP,
                                   parse_mode="HTML")
         else:
             self.bot.send_message(chat_id,
                                   f'Слово <b>{text.capitalize()}</b> не удалось удалить из базы данных.\n'
                                   'Для продолжения нажмите кнопку.',
-                                  reply_markup=start_button(),
+                                  reply_markup=_START_MARKUP,
                                   parse_mode="HTML")
 
     def _format_user_words(self, user_id: int) -> str:
@@ -259,7 +427,8 @@ class GameUtils:
         """
         Генерирует слова для перевода и соответствующие варианты перевода.
 
-        Эта функция выбирает случайный источник слов (из CSV-файла или базы данных),
+        Эта функция выбирает случайный источник слов (CSV-файл, слова пользователя
+        или общие слова из базы данных),
         а затем извлекает одно слово и его перевод. Также она генерирует список
         неправильных вариантов перевода для использования в качестве кнопок выбора.
 
@@ -270,125 +439,188 @@ class GameUtils:
              список неправильных вариантов перевода (list[str]) и id слова из БД (int).
         """
         id_user = message.from_user.id
-        flag = random.randint(0, 2)
-        logger.debug(f'def word_generator:flag {flag}')
+        flag = self._rng.randrange(3)
+        logger.debug('def word_generator:flag %d', flag)
         if flag == 0:
             word_dict = self.read_words_csv(id_user)
 
         elif flag == 1:
-            word_dict = self.read_words_bd_added_user(id_user)
+            word_dict = self.read_words_bd(id_user, prefer='bd_user')
 
         else:
-            word_dict = self.read_words_bd(id_user)
+            word_dict = self.read_words_bd(id_user, prefer='bd')
 
-        logger.debug(f'def word_generator:word_dict {word_dict}')
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug('def word_generator:word_dict %s', word_dict)
 
         try:
-            word = list(word_dict.keys())[0]
-            translation = word_dict[word][0]
-            id_word = word_dict[word][1]
-            text_buttons = [item[0] for item in list(word_dict.values())[1:]]
+            items = iter(word_dict.items())
+            word, (translation, id_word) = next(items)
+            text_buttons = [item[0] for _, item in items]
             return word, translation, text_buttons, id_word
 
         except Exception as e:
             logger.error(f'Ошибка при генерации слов: {e}')
 
-            word_dict = self.get_fallback_words()
-            word = list(word_dict.keys())[0]
-            translation = word_dict[word]
-            id_word_db = self.db.search_word(word)
-            text_buttons = list(word_dict.values())[1:]
+            items = iter(self.get_fallback_words().items())
+            word, (translation, id_word_db) = next(items)
+            text_buttons = [item[0] for _, item in items]
             return word, translation, text_buttons, id_word_db
 
     def read_words_csv(self, user_id: int, quantity: int = 4) -> dict:
         """
-            Читает указанное количество уникальных слов из CSV-файла,
-            проверяет их на дубликаты в базе данных, сохраняет найденные слова вместе
-            с их английскими переводами в словаре и удаляет выбранные слова из CSV-файла.
+            Читает указанное количество уникальных слов из CSV-файла.
+
+            Если в CSV-файле не хватает новых слов, недостающие слова
+            выбираются из базы данных.
 
             :param user_id: ID пользователя в Telegram.
             :param quantity: Необязательный параметр, определяющий требуемое количество слов
                              для чтения (по умолчанию 4).
 
             :return words_dict: dict Словарь, содержащий русские слова в качестве ключей
-                                и их английские переводы в качестве значений.
+                                и список из перевода и id слова в БД в качестве значений.
         """
         logger.debug('запускается read_words_csv')
-        words_dict = {}
-        try:
-            with open('russian_english_words.csv', newline='', encoding='utf-8') as csvfile:
-                reader = csv.reader(csvfile)
-                words = list(reader)
+        words_dict = self._sample_csv_words(quantity)
 
-            selected_words = random.sample(words[1:],
-                                           len(words[1:]) if len(words[1:]) < quantity else quantity)
+        if len(words_dict) < quantity:
+            words_dict.update(self.db.sample_words(user_id, quantity - len(words_dict)))
+        return words_dict
 
-            for word_list in selected_words:
-                id_word = self.db.search_word(word_list[0])
-                if id_word is None:
-                    id_word = self.db.save_word(word_list[0], word_list[1])
+    def _sample_csv_words(self, quantity: int) -> dict:
+        """
+            Выбирает случайные слова из CSV-файла,
+            одним запросом сохраняет их в базу данных без дубликатов, собирает слова вместе
+            с их английскими переводами в словарь и отмечает выбранные слова как использованные.
 
-                words_dict[word_list[0]] = [word_list[1], id_word]
+            Строки файла кэшируются до его изменения, выборка выполняется за один проход
+            резервуарным методом. Слова, которые уже перенесены в базу данных,
+            при выборке пропускаются, а из самого файла удаляются раз
+            в CSV_COMPACT_INTERVAL вызовов.
 
-            if len(words_dict) < quantity:
-                result = self.read_words_bd(user_id, quantity - len(words_dict))
-                words_dict.update(result)
+            :param quantity: Требуемое количество слов.
 
-            remaining_words = [word for word in words if word not in selected_words]
-            with open('russian_english_words.csv', 'w', newline='', encoding='utf-8') as csvfile:
-                writer = csv.writer(csvfile)
-                for word in remaining_words:
-                    writer.writerow(word)
+            :return words_dict: dict Словарь, содержащий русские слова в качестве ключей
+                                и список из перевода и id слова в БД в качестве значений.
+                                При ошибке чтения файла словарь может быть неполным.
+        """
+        words_dict = {}
+        try:
+            consumed = self._get_consumed_words()
+            selected_words = _reservoir_sample(
+                (row for row in self._read_csv_rows() if row[0] not in consumed), quantity, self._rng
+            )
 
-            return words_dict
+            pairs = [(word_list[0], word_list[1]) for word_list in selected_words]
+            words_id = self.db.upsert_words_bulk(pairs)
+
+            for word, translation in pairs:
+                if word in words_id:
+                    consumed.add(word)
+                    words_dict[word] = [translation, words_id[word]]
+
+            with GameUtils._csv_lock:
+                GameUtils._turn_counter += 1
+                if GameUtils._turn_counter % CSV_COMPACT_INTERVAL == 0:
+                    self._compact_csv()
 
         except Exception as e:
             logger.error(f'ошибка при чтении CSV файла {e}')
-            words_dict.update(self.read_words_bd(user_id, quantity))
-            return words_dict
+        return words_dict
 
-    def read_words_bd(self, user_id, quantity: int = 4) -> dict:
+    def _read_csv_rows(self) -> list:
         """
-        Запрашивает слова с переводом из базы данных.
+            Возвращает строки CSV-файла без заголовка.
 
-        Эта функция запрашивает слова, которые пользователь еще не видел 4 раза,
-        из базы данных. Если найденных слов меньше необходимого количества,
-        оставшиеся слова выбираются из CSV-файла.
+            Разобранные строки хранятся на уровне класса и перечитываются
+            только при изменении времени модификации файла. Если в файле нет кавычек,
+            строки разбираются простым разделением по первой запятой вместо csv.reader.
 
-        :param user_id: ID пользователя в Telegram.
-        :param quantity: Необязательный параметр, определяющий требуемое количество слов
-                             для чтения (по умолчанию 4).
+            :return: list Список строк в формате [русское_слово, перевод].
+        """
+        mtime = os.stat(CSV_PATH).st_mtime
+        if GameUtils._csv_cache is None or mtime != GameUtils._csv_mtime:
+            with open(CSV_PATH, 'rb') as csvfile:
+                data = csvfile.read().decode('utf-8')
 
-        :return: dict Словарь, содержащий русские слова в качестве ключей и их
-                 английские переводы в качестве значений.
+            if '"' in data:
+                rows = [row for row in csv.reader(io.StringIO(data, newline='')) if row]
+            else:
+                rows = [line.split(',', 1) for line in data.splitlines() if line]
+
+            GameUtils._csv_header = rows[0] if rows else None
+            GameUtils._csv_cache = rows[1:]
+            GameUtils._csv_mtime = mtime
+        return GameUtils._csv_cache
+
+    def _compact_csv(self):
         """
-        logger.debug('запускается read_words_bd')
-        result = self.db.get_random_words_for_user(user_id, quantity)
+            Удаляет из CSV-файла слова, которые уже перенесены в базу данных.
 
-        if len(result) < quantity:
-            csv_word = self.read_words_csv(user_id, quantity - len(result))
-            result.update(csv_word)
-        return result
+            Файл записывается во временный файл в той же папке и затем атомарно
+            заменяет исходный, поэтому сбой во время записи не повреждает CSV-файл.
+        """
+        consumed = self._get_consumed_words()
+        rows = self._read_csv_rows()
+        # consumed — множество, поэтому фильтрация выполняется за один проход по файлу
+        remaining_words = [row for row in rows if row[0] not in consumed]
+        if len(remaining_words) == len(rows):
+            return
+
+        csv_dir = os.path.dirname(os.path.abspath(CSV_PATH))
+        tmp_file = tempfile.NamedTemporaryFile('w', dir=csv_dir, suffix='.tmp', newline='',
+                                               encoding='utf-8', delete=False)
+        try:
+            with tmp_file:
+                writer = csv.writer(tmp_file)
+                if GameUtils._csv_header is not None:
+                    writer.writerow(GameUtils._csv_header)
+                writer.writerows(remaining_words)
+            os.replace(tmp_file.name, CSV_PATH)
+        except OSError as e:
+            logger.error(f'ошибка при записи CSV файла {e}')
+            os.remove(tmp_file.name)
+            return
+
+        GameUtils._csv_cache = None
+        logger.info(f'Из CSV файла удалено {len(rows) - len(remaining_words)} слов')
 
-    def read_words_bd_added_user(self, user_id) -> dict:
+    def _get_consumed_words(self) -> set:
         """
-        Запрашивает слова с переводом из базы данных добавленные пользователем.
+            Возвращает множество слов из CSV-файла, которые уже перенесены в базу данных.
 
-        Эта функция запрашивает слова, которые добавил пользователь и еще не видел 4 раза,
-        из базы данных. Если найденных слов меньше необходимого количества,
-        оставшиеся слова выбираются из CSV-файла.
+            При первом обращении множество заполняется общими словами из базы данных,
+            дальше пополняется по мере выборки слов из CSV-файла.
+
+            :return: set Множество русских слов, которые не нужно выбирать повторно.
+        """
+        if GameUtils._csv_consumed is None:
+            GameUtils._csv_consumed = self.db.get_global_words()
+        return GameUtils._csv_consumed
+
+    def read_words_bd(self, user_id, quantity: int = 4, prefer: str = 'bd') -> dict:
+        """
+        Запрашивает слова с переводом из базы данных.
+
+        Эта функция одним запросом выбирает слова, которые пользователь еще не видел 4 раза:
+        сначала из предпочтительного источника, затем из другого. Если найденных слов
+        меньше необходимого количества, оставшиеся слова выбираются из CSV-файла.
 
         :param user_id: ID пользователя в Telegram.
+        :param quantity: Необязательный параметр, определяющий требуемое количество слов
+                             для чтения (по умолчанию 4).
+        :param prefer: Предпочтительный источник слов: 'bd_user' — слова, добавленные
+                       пользователем, 'bd' — общие слова (по умолчанию 'bd').
 
-        :return: dict Словарь, содержащий русские слова в качестве ключей и их
-                 английские переводы в качестве значений.
+        :return: dict Словарь, содержащий русские слова в качестве ключей и
+                 список из перевода и id слова в БД в качестве значений.
         """
-        logger.debug('запускается read_words_bd_added_user')
-        result = self.db.get_random_words_for_user(user_id, flag=True)
+        logger.debug('запускается read_words_bd')
+        result = self.db.sample_words(user_id, quantity, prefer)
 
-        if len(result) < 4:
-            bd_word = self.read_words_bd(user_id, 4 - len(result))
-            result.update(bd_word)
+        if len(result) < quantity:
+            result.update(self._sample_csv_words(quantity - len(result)))
         return result
 
     def display_player_rating(self, telegram_user_id) -> str:
@@ -405,46 +637,42 @@ class GameUtils:
             :return: Сообщение с рейтингом для отправки пользователю.
         """
         msg = ''
-        rating_data = self.db.get_player_ratings()
-        user_position = None
-        for idx, user in enumerate(rating_data):
-            if user['telegram_user_id'] == telegram_user_id:
-                user_position = idx + 1
-                break
+        top_data, requester = self.db.get_rating_snapshot(telegram_user_id)
 
-        if user_position:
+        if requester:
+            user_position = requester.position
             if user_position <= 3:
-                for idx, user in enumerate(rating_data[:3]):
+                for idx, user in enumerate(top_data[:3]):
                     msg += self._format_rating_entry(user_position, idx + 1, user)
 
             elif user_position in [4, 5]:
-                for idx, user in enumerate(rating_data[:user_position]):
+                for idx, user in enumerate(top_data[:user_position]):
                     msg += self._format_rating_entry(user_position, idx + 1, user)
 
             else:
-                for idx, user in enumerate(rating_data[:3]):
-                    msg += f'{self._get_medal(idx + 1)} {user["name"]} - "{user["points"]} очков"\n'
+                for idx, user in enumerate(top_data[:3]):
+                    msg += f'{self._get_medal(idx + 1)} {user.name} - "{user.points} очков"\n'
                 msg += '...\n'
-                msg += f'<b>\t{user_position}.{rating_data[user_position - 1]["name"]} - ' \
-                       f'"{rating_data[user_position - 1]["points"]} очков"</b>'
+                msg += f'<b>\t{user_position}.{requester.name} - ' \
+                       f'"{requester.points} очков"</b>'
         else:
             msg += 'Пользователь не найден в рейтинге.'
         return msg
 
-    def _format_rating_entry(self, user_position: int, idx: int, user: dict) -> str:
+    def _format_rating_entry(self, user_position: int, idx: int, user: Rating) -> str:
         """
             Форматирует запись рейтинга с учетом позиции пользователя.
 
             :param user_position: Позиция пользователя в рейтинге.
             :param idx: Текущая обрабатываемая позиция в рейтинге.
-            :param user: Словарь с данными пользователя (имя и очки).
+            :param user: Запись рейтинга пользователя (имя и очки).
 
             :return: Форматированная строка для отображения в рейтинге.
         """
         if user_position == idx:
-            msg = f'<b>{self._get_medal(idx)} {user["name"]} - "{user["points"]} очков"</b>\n'
+            msg = f'<b>{self._get_medal(idx)} {user.name} - "{user.points} очков"</b>\n'
         else:
-            msg = f'{self._get_medal(idx)} {user["name"]} - "{user["points"]} очков"\n'
+            msg = f'{self._get_medal(idx)} {user.name} - "{user.points} очков"\n'
         return msg
 
     def _get_medal(self, idx: int) -> str:
@@ -469,49 +697,19 @@ class GameUtils:
         """
         Возвращает резервный набор слов из 20 русско-английских пар.
 
-        Эта функция выбирает 4 случайных слова из этого набора, проверяет их наличие
-        в базе данных,
-        и, если слово отсутствует, сохраняет его в базу данных.
+        Эта функция выбирает 4 случайных слова из этого набора и сохраняет
+        отсутствующие в базе данных слова одним запросом.
 
         :param quantity: Необязательный параметр, определяющий требуемое количество слов
                              для чтения (по умолчанию 4).
 
-        :return: dict Словарь, содержащий русские слова в качестве ключей и их английские
-                 переводы в качестве значений.
+        :return: dict Словарь, где ключами являются русские слова,
+                 а значениями — список из перевода на английский язык и id слов в БД.
         """
         logger.debug('запуск резервного списка')
-        fallback_words = {
-            'кот': 'cat',
-            'собака': 'dog',
-            'молоко': 'milk',
-            'хлеб': 'bread',
-            'яблоко': 'apple',
-            'машина': 'car',
-            'дом': 'house',
-            'окно': 'window',
-            'дерево': 'tree',
-            'книга': 'book',
-            'ручка': 'pen',
-            'стол': 'table',
-            'стул': 'chair',
-            'часы': 'clock',
-            'зонт': 'umbrella',
-            'солнце': 'sun',
-            'луна': 'moon',
-            'звезда': 'star',
-            'рыба': 'fish',
-            'птица': 'bird'
-        }
-        selected_words = random.sample(list(fallback_words.items()), quantity)
-        words_dict = {}
-
-        for word, translation in selected_words:
-            check_word_bd = self.db.search_word(word)
-            if check_word_bd is None:
-                self.db.save_word(word, translation)
-            words_dict[word] = translation
-
-        return words_dict
+        selected_words = self._rng.sample(_FALLBACK_WORDS, quantity)
+        ids = self.db.upsert_words_bulk(selected_words)
+        return {word: [translation, ids.get(word)] for word, translation in selected_words}
 
 
 class DatabaseUtils(Database):
@@ -519,6 +717,10 @@ class DatabaseUtils(Database):
        Класс для управления базой данных, наследующий методы и свойства из класса Database.
     """
 
+    _user_cache: dict[int, tuple[float, dict]] = {}
+    _user_id_cache: dict[int, int] = {}
+    _rating_cache: dict[object, tuple[float, object]] = {}
+
     def __init__(self):
         super().__init__()
 
@@ -558,6 +760,16 @@ class DatabaseUtils(Database):
         self.create_table(table_name_word, columns_word)
         self.create_table(table_name_user_word, columns_user_word)
 
+        self.create_index('word_ru_global', table_name_word, 'russian_words',
+                          unique=True, condition='user_id IS NULL')
+        self.create_index('users_word_user_word_uniq', table_name_user_word,
+                          'user_id, word_id', unique=True, include='times_shown')
+        self.create_index('word_user_idx', table_name_word, 'user_id',
+                          condition='user_id IS NOT NULL')
+        self.create_index('word_ru_user_uniq', table_name_word, 'russian_words, user_id',
+                          unique=True)
+        self.create_index('users_points_idx', table_name_user, 'points DESC')
+
     def save_user(self, name: str, tg_user_id: int):
         """
         Сохраняет информацию о пользователе в базе данных.
@@ -573,7 +785,11 @@ class DatabaseUtils(Database):
             'telegram_user_id': tg_user_id,
             'name': name
         }
-        self.insert_data(table_name=table_name, data=data)
+        user_id = self.insert_data(table_name=table_name, data=data)
+        self._user_cache.pop(tg_user_id, None)
+        if user_id is not None:
+            self._user_id_cache[tg_user_id] = user_id
+        self._invalidate_ratings()
 
     def search_user(self, tg_user_id: int) -> dict:
         """
@@ -582,28 +798,48 @@ class DatabaseUtils(Database):
         Функция выполняет запрос в таблицу `users`, чтобы найти пользователя по его
         идентификатору в Телеграме. Если пользователь найден, возвращает словарь с
         информацией о пользователе (ID, имя, очки). В противном случае возвращает `None`.
+        Найденные пользователи кэшируются на USER_CACHE_TTL секунд.
 
         :param tg_user_id: int Идентификатор пользователя в Телеграме.
 
         :return: dict Словарь с информацией о пользователе (ID, имя, очки) или `None`,
                       если пользователь не найден.
         """
-        table_name = 'users'
-        columns = 'id,name,points'
-        values = (tg_user_id,)
-        condition = 'telegram_user_id = %s'
-        result = self.select_data(table_name=table_name, columns=columns,
-                                  values=values, condition=condition)
+        cached = self._user_cache.get(tg_user_id)
+        if cached is not None and time.monotonic() - cached[0] < USER_CACHE_TTL:
+            return cached[1]
+
+        result = self.execute_query(SQL_SEARCH_USER, (tg_user_id,), fetch=True, prepare=True)
         if result:
             user_info = {
                 'id': result[0][0],
                 'name': result[0][1],
                 'points': result[0][2]
             }
+            self._user_cache[tg_user_id] = (time.monotonic(), user_info)
+            self._user_id_cache[tg_user_id] = user_info['id']
         else:
             user_info = None
         return user_info
 
+    def _internal_user_id(self, tg_user_id: int) -> int | None:
+        """
+        Возвращает внутренний ID пользователя (users.id) по его Telegram ID.
+
+        Соответствие не меняется, пока пользователь существует, поэтому оно
+        кэшируется без ограничения по времени и запрос к `users` выполняется
+        один раз на пользователя.
+
+        :param tg_user_id: ID пользователя в Telegram.
+        :return: ID пользователя в таблице `users` или `None`, если пользователь не найден.
+        """
+        user_id = self._user_id_cache.get(tg_user_id)
+        if user_id is None:
+            user = self.search_user(tg_user_id)
+            if user is not None:
+                user_id = user['id']
+        return user_id
+
     def search_word(self, word: str, user_id: int = None) -> int | None:
         """
         Ищет слово в базе данных.
@@ -619,18 +855,11 @@ class DatabaseUtils(Database):
 
         :return: int Идентификатор слова в базе данных или `None`, если слово не найдено.
         """
-        table_name = 'word'
-        condition = 'russian_words = %s '
-        values = (word,)
-
         if user_id is not None:
-            condition += 'AND user_id = %s'
-            values = (word, user_id)
+            result = self.execute_query(SQL_SEARCH_USER_WORD, (word, user_id),
+                                        fetch=True, prepare=True)
         else:
-            condition += 'AND user_id IS NULL'
-
-        result = self.select_data(table_name, 'id',
-                                  condition=condition, values=values)
+            result = self.execute_query(SQL_SEARCH_GLOBAL_WORD, (word,), fetch=True, prepare=True)
         if result:
             answer = result[0][0]
         else:
@@ -662,56 +891,83 @@ class DatabaseUtils(Database):
         result = self.insert_data(table_name, data)
         return result
 
-    def get_random_words_for_user(self, user_id: int, quantity: int = 4,
-                                  flag: bool = False) -> dict:
+    def add_user_word(self, word: str, translation: str, user_id: int) -> int | None:
+        """
+        Сохраняет слово пользователя, если у него еще нет такого слова.
+
+        Проверка наличия и вставка выполняются одним запросом
+        INSERT ... ON CONFLICT DO NOTHING.
+
+        :param word: str Слово на русском языке.
+        :param translation: str Перевод слова на английский язык.
+        :param user_id: int Идентификатор пользователя в Telegram.
+
+        :return: int ID нового слова или `None`, если слово уже есть у пользователя.
+        """
+        result = self.execute_query(SQL_ADD_USER_WORD, (word, translation, user_id),
+                                    fetch=True, prepare=True)
+        return result[0][0] if result else None
+
+    def upsert_words_bulk(self, pairs: list[tuple[str, str]]) -> dict[str, int]:
+        """
+        Сохраняет общие слова с переводами одним запросом и возвращает их ID.
+
+        Слова, которые уже есть в базе данных, не дублируются: для них обновляется
+        перевод и возвращается существующий ID.
+
+        :param pairs: list Список пар (русское слово, перевод).
+
+        :return: dict Словарь, где ключами являются русские слова, а значениями — их ID в БД.
+        """
+        words = dict(pairs)
+        if not words:
+            return {}
+
+        result = self.insert_many(
+            table_name='word',
+            columns=['russian_words', 'translation'],
+            rows=list(words.items()),
+            on_conflict='(russian_words) WHERE user_id IS NULL '
+                        'DO UPDATE SET translation = EXCLUDED.translation',
+            returning='id, russian_words'
+        )
+        return {word: id_word for id_word, word in result}
+
+    def get_global_words(self) -> set:
+        """
+        Возвращает общие слова из базы данных, не привязанные к пользователю.
+
+        :return: set Множество русских слов из таблицы `word` с `user_id IS NULL`.
+        """
+        result = self.select_data(table_name='word', columns='russian_words',
+                                  condition='user_id IS NULL')
+        return {row[0] for row in result}
+
+    def sample_words(self, user_id: int, quantity: int = 4, prefer: str = 'bd') -> dict:
         """
         Получает случайные слова для пользователя, которые показывались ему менее 4 раз,
             и возвращает их в виде словаря.
 
-        Функция извлекает из базы данных слова, которые пользователю еще
-            не показывались 4 и более раз.
-        Количество выбираемых слов можно задать через параметр `quantity` (по умолчанию 4).
-        Если `flag` установлен в `True`, выбираются только слова, добавленные самим пользователем.
-        Если `flag` равен `False`, выбираются слова из общего списка.
+        Слова, добавленные самим пользователем (`'bd_user'`), и слова из общего
+        списка (`'bd'`) выбираются одним запросом через UNION ALL. Сначала идут слова
+        из источника `prefer`, а если их не хватает — слова из другого источника.
 
         Результат возвращается в виде словаря, где ключами являются русские слова,
             а значениями — список из перевода на английский язык и id слов в БД.
 
-        :param user_id: int Идентификатор пользователя в базе данных.
+        :param user_id: int Идентификатор пользователя в Telegram.
         :param quantity: int Количество случайных слов для выбора (по умолчанию 4).
-        :param flag: bool Указывает, выбирать ли слова, добавленные самим пользователем (`True`),
-                     или из общего списка (`False`).
+        :param prefer: str Предпочтительный источник слов: 'bd_user' или 'bd' (по умолчанию 'bd').
 
         :return: dict Словарь с выбранными словами, где ключами являются русские слова,
                      а значениями — список из перевода на английский язык и id слов в БД.
         """
-        user_condition = f'AND w.user_id = {user_id}' if flag else 'AND w.user_id IS NULL'
+        internal_id = self._internal_user_id(user_id)
+        values = (user_id, internal_id, quantity, internal_id, quantity, prefer, quantity)
+        result = self.execute_query(SQL_SAMPLE_WORDS, values, fetch=True, prepare=True)
 
         words_dict = {}
-        table_name = 'word w'
-        columns = 'w.russian_words, w.translation, w.id'
-        condition = f"""
-            w.id NOT IN (
-                SELECT uw.word_id
-                FROM users_word uw
-                WHERE uw.user_id = (
-                        SELECT u.id
-                        FROM users u
-                        WHERE u.telegram_user_id = {user_id}
-                    
-                        )
-                GROUP BY uw.word_id
-                HAVING SUM(uw.times_shown) >= 4
-            )
-            {user_condition}
-            ORDER BY RANDOM()
-            LIMIT {quantity};        
-        """
-        result_bd_word = self.select_data(table_name=table_name,
-                                          columns=columns,
-                                          condition=condition
-                                          )
-        for words in result_bd_word:
+        for words in result:
             words_dict[words[0]] = [words[1], words[2]]
         return words_dict
 
@@ -723,72 +979,101 @@ class DatabaseUtils(Database):
             :param points: Количество очков для добавления или вычитания.
             :param add: Флаг, указывающий, добавлять (True) или вычитать (False) очки.
         """
-        if add:
-            data = {'points': f'points + {points}'}
-        else:
-            data = {'points': f'points - {points}'}
+        delta = points if add else -points
+        self.increment_column(table_name='users', column='points', delta=delta,
+                              condition='telegram_user_id = %s', values=(user_id,))
+        self._update_cached_points(user_id, delta)
 
-        table_name = 'users'
-        condition = f'users.telegram_user_id = {user_id}'
-        self.update_data(table_name=table_name, data=data, condition=condition)
+    def _update_cached_points(self, tg_user_id: int, delta: int):
+        """
+            Изменяет количество очков пользователя в кэше, не сбрасывая запись,
+            и сбрасывает кэш рейтинга.
 
-    def update_times_shown(self, telegram_user_id: int, word_id: int):
+            :param tg_user_id: ID пользователя в Telegram.
+            :param delta: Изменение количества очков.
         """
-        Обновляет количество показов слова для пользователя.
+        cached = self._user_cache.get(tg_user_id)
+        if cached is not None:
+            cached[1]['points'] += delta
+        self._invalidate_ratings()
 
-        :param telegram_user_id: ID пользователя в Telegram.
+    def _invalidate_ratings(self):
+        """
+            Сбрасывает кэш рейтинга. Вызывается каждым методом, изменяющим `users.points`
+            или состав таблицы `users`.
+        """
+        self._rating_cache.clear()
+
+    def record_correct_answer(self, tg_user_id: int, word_id: int, delta: int = 1):
+        """
+        Начисляет очки за правильный ответ и увеличивает количество показов слова.
+
+        Оба изменения выполняются одним запросом в одной транзакции.
+
+        :param tg_user_id: ID пользователя в Telegram.
         :param word_id: ID слова.
+        :param delta: Количество начисляемых очков (по умолчанию 1).
         """
-        table_name = 'users_word uw'
-        columns = 'uw.id'
-        condition = """ uw.word_id = %s
-                            AND uw.user_id = (
-                                SELECT u.id 
-                                FROM users AS u
-                                WHERE u.telegram_user_id = %s
-                            );
-                    """
-        values = (word_id, telegram_user_id)
-        user_word_id = self.select_data(table_name=table_name, columns=columns,
-                                        condition=condition, values=values)
-        if user_word_id:
-            data = {'times_shown': 'times_shown + 1'}
-            condition = 'id = %s'
-            values = (user_word_id[0][0],)
-            self.update_data(table_name=table_name[:-3], data=data,
-                             condition=condition, values=values)
-        else:
-            user_id = self.select_data(table_name='users', columns='id',
-                                       condition='telegram_user_id = %s',
-                                       values=(telegram_user_id,))
-
-            data = {
-                'user_id': user_id[0][0],
-                'word_id': word_id,
-                'times_shown': 1
-            }
-            self.insert_data(table_name='users_word', data=data)
+        self.execute_query(SQL_RECORD_CORRECT_ANSWER, (delta, tg_user_id, word_id), prepare=True)
+        self._update_cached_points(tg_user_id, delta)
 
-    def get_player_ratings(self) -> list:
+    def get_player_ratings(self, limit: int = None) -> list:
         """
             Получает рейтинг игроков на основе их очков.
 
             Функция выполняет запрос к базе данных для получения списка игроков,
             отсортированного по количеству очков в порядке убывания. Возвращает
-            результат в виде списка, где каждый элемент содержит идентификатор пользователя
-            в Telegram, имя и количество очков.
+            результат в виде списка `Rating`, где каждый элемент содержит идентификатор
+            пользователя в Telegram, имя, количество очков и место.
+            Результат кэшируется на RATING_CACHE_TTL секунд.
+
+            :param limit: Количество первых мест рейтинга (по умолчанию — все игроки).
 
-            :return: list Список кортежей с информацией о пользователях,
+            :return: list Список `Rating` с информацией о пользователях,
                           отсортированный по убыванию очков.
         """
-        table_name = 'users ORDER BY points DESC'
-        columns = 'telegram_user_id, name, points'
-
-        result = self.select_data(table_name=table_name, columns=columns)
-        rating_list = [{'telegram_user_id': row[0], 'name': row[1],
-                        'points': row[2]} for row in result]
+        cache_key = (limit,)
+        cached = self._rating_cache.get(cache_key)
+        if cached is not None and time.monotonic() - cached[0] < RATING_CACHE_TTL:
+            return cached[1]
+
+        result = self.execute_query(SQL_GET_RATINGS, (limit,), fetch=True, prepare=True)
+        rating_list = list(map(Rating._make, result))
+        self._rating_cache[cache_key] = (time.monotonic(), rating_list)
         return rating_list
 
+    def get_rating_snapshot(self, tg_user_id: int) -> tuple[list, Rating | None]:
+        """
+            Получает верхнюю часть рейтинга и место запрашивающего пользователя.
+
+            Места вычисляются в базе данных оконной функцией, поэтому передаются только
+            первые пять строк рейтинга и строка самого пользователя.
+            Результат кэшируется на RATING_CACHE_TTL секунд.
+
+            :param tg_user_id: ID пользователя в Telegram.
+
+            :return: Кортеж из списка первых пяти мест и записи `Rating` пользователя
+                     (или `None`, если пользователь не найден). Каждая запись содержит
+                     идентификатор пользователя в Telegram, имя, очки и место.
+        """
+        cache_key = ('snapshot', tg_user_id)
+        cached = self._rating_cache.get(cache_key)
+        if cached is not None and time.monotonic() - cached[0] < RATING_CACHE_TTL:
+            return cached[1]
+
+        result = self.execute_query(SQL_RATING_SNAPSHOT, (tg_user_id,), fetch=True, prepare=True)
+
+        top_list = []
+        requester = None
+        for entry in map(Rating._make, result):
+            if entry.position <= 5:
+                top_list.append(entry)
+            if entry.telegram_user_id == tg_user_id:
+                requester = entry
+
+        self._rating_cache[cache_key] = (time.monotonic(), (top_list, requester))
+        return top_list, requester
+
     def get_user_word(self, user_id: int) -> dict:
         """
         Извлекает список слов, добавленных пользователем в базу данных.
@@ -799,21 +1084,15 @@ class DatabaseUtils(Database):
         :param user_id: Идентификатор пользователя в Telegram.
 
         :return dict: Словарь слов на русском языке и количество повторений
-                    добавленных пользователем в базу данных.
+                    добавленных пользователем в базу данных. При ошибке базы данных
+                    возвращается пустой словарь, а не его часть.
         """
-        words = {}
-        table_name = 'word w LEFT JOIN users_word uw ON w.id = uw.word_id'
-        columns = 'w.russian_words, uw.times_shown'
-        condition = 'w.user_id = %s'
-        values = (user_id,)
-
-        result = self.select_data(table_name=table_name, columns=columns,
-                                  condition=condition, values=values)
-
-        for word in result:
-            words[word[0]] = word[1]
-
-        return words
+        values = (self._internal_user_id(user_id), user_id)
+        try:
+            return dict(self.stream_query(SQL_GET_USER_WORDS, values))
+        except psycopg2.DatabaseError:
+            # Ошибка уже залогирована в stream_query
+            return {}
 
     def delete_word(self, word: str, user_id: int) -> bool:
         """
@@ -828,13 +1107,9 @@ class DatabaseUtils(Database):
 
         :return: bool Возвращает `True`, если слово успешно удалено, и `False` в противном случае.
         """
-        table_name = 'word'
-        condition = 'russian_words = %s AND user_id = %s'
-        values = (word, user_id)
-
-        result = self.delete_data(table_name=table_name, condition=condition, values=values)
-
-        return result
+        result = self.execute_query(SQL_DELETE_USER_WORD, (word, user_id),
+                                    fetch=True, prepare=True)
+        return bool(result)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,106 @@
+"""
+    Модуль содержит тексты SQL-запросов, которые используются в DatabaseUtils.
+    Текст каждого запроса неизменен, поэтому они выполняются как подготовленные
+    операторы и план на сервере переиспользуется между вызовами (кроме запросов,
+    результат которых читается серверным курсором).
+"""
+
+# Слово считается изученным, если пользователю показали его не менее 4 раз.
+# Параметр — внутренний users.id пользователя
+_NOT_LEARNED = """
+    NOT EXISTS (
+        SELECT 1
+        FROM users_word uw
+        WHERE uw.user_id = %s::int
+            AND uw.word_id = w.id
+            AND uw.times_shown >= 4
+    )
+"""
+
+SQL_SAMPLE_WORDS = f"""
+    SELECT russian_words, translation, id
+    FROM (
+        (SELECT w.russian_words, w.translation, w.id, 'bd_user' AS src
+         FROM word w
+         WHERE w.user_id = %s AND {_NOT_LEARNED}
+         ORDER BY RANDOM()
+         LIMIT %s)
+        UNION ALL
+        (SELECT w.russian_words, w.translation, w.id, 'bd' AS src
+         FROM word w
+         WHERE w.user_id IS NULL AND {_NOT_LEARNED}
+         ORDER BY RANDOM()
+         LIMIT %s)
+    ) AS candidates
+    ORDER BY CASE src WHEN %s THEN 0 ELSE 1 END, RANDOM()
+    LIMIT %s
+"""
+
+# Единственное место, где увеличивается users_word.times_shown: показ засчитывается
+# при правильном ответе. Требует уникальный индекс users_word(user_id, word_id)
+SQL_RECORD_CORRECT_ANSWER = """
+    WITH u AS (
+        UPDATE users
+        SET points = points + %s
+        WHERE telegram_user_id = %s
+        RETURNING id
+    )
+    INSERT INTO users_word (user_id, word_id, times_shown)
+    SELECT id, %s, 1 FROM u
+    ON CONFLICT (user_id, word_id)
+    DO UPDATE SET times_shown = users_word.times_shown + 1
+"""
+
+SQL_RATING_SNAPSHOT = """
+    WITH ranked AS (
+        SELECT telegram_user_id, name, points,
+               ROW_NUMBER() OVER (ORDER BY points DESC) AS position
+        FROM users
+    )
+    SELECT telegram_user_id, name, points, position
+    FROM ranked
+    WHERE position <= 5 OR telegram_user_id = %s
+    ORDER BY position
+"""
+
+SQL_SEARCH_USER = """
+    SELECT id, name, points FROM users WHERE telegram_user_id = %s
+"""
+
+SQL_SEARCH_GLOBAL_WORD = """
+    SELECT id FROM word WHERE russian_words = %s AND user_id IS NULL
+"""
+
+SQL_SEARCH_USER_WORD = """
+    SELECT id FROM word WHERE russian_words = %s AND user_id = %s
+"""
+
+# LIMIT NULL в PostgreSQL означает выборку без ограничения
+SQL_GET_RATINGS = """
+    SELECT telegram_user_id, name, points,
+           ROW_NUMBER() OVER (ORDER BY points DESC) AS position
+    FROM users
+    ORDER BY points DESC
+    LIMIT %s
+"""
+
+# word.user_id хранит Telegram ID, а users_word.user_id — внутренний users.id,
+# поэтому запрос принимает оба идентификатора пользователя
+SQL_GET_USER_WORDS = """
+    SELECT w.russian_words, COALESCE(uw.times_shown, 0)
+    FROM word w
+    LEFT JOIN users_word uw ON uw.word_id = w.id AND uw.user_id = %s::int
+    WHERE w.user_id = %s
+"""
+
+SQL_DELETE_USER_WORD = """
+    DELETE FROM word WHERE russian_words = %s AND user_id = %s RETURNING id
+"""
+
+# Требует уникальный индекс word(russian_words, user_id) — word_ru_user_uniq
+SQL_ADD_USER_WORD = """
+    INSERT INTO word (russian_words, translation, user_id)
+    VALUES (%s, %s, %s)
+    ON CONFLICT (russian_words, user_id) DO NOTHING
+    RETURNING id
+"""